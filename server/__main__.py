@@ -7,6 +7,7 @@ from typing import Any
 import aiofiles
 import httpx
 
+from server import feed
 from server.models import Achievement, PlayerGameAchievements
 from server.utils import Result, is_error
 
@@ -100,6 +101,7 @@ async def _get_player_achievements(
         completion = achieved_count / len(achievements)
         game_achievements = PlayerGameAchievements(
             steam_id=data["steamID"],
+            game_id=str(game_id),
             game_name=data["gameName"],
             achievements=achievements,
             completion=completion,
@@ -119,11 +121,24 @@ async def _calculate_average_completion(steam_id: str) -> float:
         await log(f"Got {len(game_ids)} owned games.")
         completions: list[float] = []
         i = 0
+        fetch_time = int(time.time() * 1000)
         tasks = [asyncio.create_task(
             _get_player_achievements(steam_id, game_id, client)
         ) for game_id in game_ids]
         achievement_gathering = await asyncio.gather(*tasks)
         assert len(achievement_gathering) == len(game_ids)
+        recorded = await feed.record_changes(steam_id, [
+            game_achievements
+            for game_achievements in achievement_gathering
+            if not is_error(game_achievements)
+        ], fetch_time)
+        if is_error(recorded):
+            await log(f"Failed to record achievement changes: {recorded}")
+        else:
+            events, warning = recorded
+            if warning is not None:
+                await log(f"Re-baselined achievement snapshot: {warning}")
+            await log(f"Recorded {len(events)} achievement change events.")
         for game_achievements in achievement_gathering:
             i += 1
             if is_error(game_achievements):
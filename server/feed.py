@@ -0,0 +1,262 @@
+"""
+Achievement change feed.
+
+Each collection run is diffed against the last stored snapshot of a player's
+achievements, and only the changes are appended to a local event log. The
+log is append-only, one JSON event per line, so consumers can tail it from a
+byte offset instead of re-reading full libraries.
+"""
+
+import asyncio
+import os
+from pathlib import Path
+
+import aiofiles
+import aiofiles.os
+
+from server.models import (
+    AchievementEvent,
+    AchievementEventType,
+    GameAchievementsSnapshot,
+    PlayerGameAchievements,
+    PlayerSnapshot,
+)
+from server.utils import Result, StringCodedError, Time, is_error, time
+
+EVENT_LOG_PATH = Path(Path.cwd(), "var/events.log")
+SNAPSHOTS_DIR = Path(Path.cwd(), "var/snapshots")
+
+CODE_CORRUPT_SNAPSHOT_ERR = "corrupt_snapshot_err"
+
+def to_snapshot(
+    game_achievements: PlayerGameAchievements
+) -> GameAchievementsSnapshot:
+    keys = []
+    achieved = 0
+    unlock_times = []
+    for i, achievement in enumerate(game_achievements.achievements):
+        keys.append(achievement.key)
+        unlock_times.append(achievement.unlock_time)
+        if achievement.is_achieved:
+            achieved |= 1 << i
+    return GameAchievementsSnapshot(
+        game_id=game_achievements.game_id,
+        keys=keys,
+        achieved=achieved,
+        unlock_times=unlock_times,
+    )
+
+def diff(
+    previous: GameAchievementsSnapshot,
+    current: GameAchievementsSnapshot,
+    steam_id: str,
+    game_name: str,
+    timestamp: Time,
+) -> list[AchievementEvent]:
+    """
+    Compare two snapshots of the same game and return events for achievements
+    which were added to the game or unlocked since the previous snapshot.
+
+    An already unlocked achievement with a changed unlock time is reported as
+    unlocked again, since the player has reset and re-earned it.
+    """
+    if previous == current:
+        return []
+
+    def event(
+        event_type: AchievementEventType, key: str, unlock_time: Time
+    ) -> AchievementEvent:
+        return AchievementEvent(
+            type=event_type,
+            steam_id=steam_id,
+            game_id=current.game_id,
+            game_name=game_name,
+            key=key,
+            unlock_time=unlock_time,
+            time=timestamp,
+        )
+
+    previous_index = {key: i for i, key in enumerate(previous.keys)}
+    events = []
+    for i, key in enumerate(current.keys):
+        is_achieved = (current.achieved >> i) & 1 == 1
+        unlock_time = current.unlock_times[i]
+        j = previous_index.get(key)
+        if j is None:
+            events.append(event("added", key, unlock_time))
+            if is_achieved:
+                events.append(event("unlocked", key, unlock_time))
+            continue
+        was_achieved = (previous.achieved >> j) & 1 == 1
+        if is_achieved and (
+            not was_achieved or previous.unlock_times[j] != unlock_time
+        ):
+            events.append(event("unlocked", key, unlock_time))
+    return events
+
+def _diff_new_game(
+    current: GameAchievementsSnapshot,
+    steam_id: str,
+    game_name: str,
+    since: Time,
+    timestamp: Time,
+) -> list[AchievementEvent]:
+    """
+    Events for a game which is new to a player with an existing snapshot:
+    the game was bought, failed to fetch before, or has just got its first
+    achievements. Only achievements unlocked after `since` are reported, the
+    earlier ones are covered by the baseline.
+    """
+    empty = GameAchievementsSnapshot(
+        game_id=current.game_id, keys=[], achieved=0, unlock_times=[]
+    )
+    return [
+        event
+        for event in diff(empty, current, steam_id, game_name, timestamp)
+        if event.type == "unlocked" and event.unlock_time > since
+    ]
+
+def _get_snapshot_path(steam_id: str) -> Path:
+    return Path(SNAPSHOTS_DIR, f"{steam_id}.json")
+
+async def load_snapshot(steam_id: str) -> Result[PlayerSnapshot | None]:
+    """
+    Load the stored snapshot of a player, or None if there is none yet.
+
+    A snapshot which cannot be parsed is moved aside to `<steam_id>.json.bad`
+    and an error coded `CODE_CORRUPT_SNAPSHOT_ERR` is returned. Other errors,
+    such as failed reads, leave the stored file in place.
+    """
+    path = _get_snapshot_path(steam_id)
+    try:
+        if not await aiofiles.os.path.exists(path):
+            return None
+        async with aiofiles.open(path, mode="rb") as f:
+            data = await f.read()
+    except Exception as error:
+        return error
+    try:
+        return PlayerSnapshot.model_validate_json(data)
+    except ValueError as error:
+        bad_path = path.with_suffix(".json.bad")
+        try:
+            await aiofiles.os.replace(path, bad_path)
+        except Exception as replace_error:
+            return replace_error
+        return StringCodedError(
+            f"snapshot moved to `{bad_path}`: {error}",
+            CODE_CORRUPT_SNAPSHOT_ERR,
+        )
+
+async def save_snapshot(
+    steam_id: str, snapshot: PlayerSnapshot
+) -> Result[None]:
+    """
+    Write the snapshot to a temporary file, fsync it, then replace the stored
+    one with it.
+    """
+    path = _get_snapshot_path(steam_id)
+    tmp_path = path.with_suffix(".json.tmp")
+    try:
+        await aiofiles.os.makedirs(path.parent, exist_ok=True)
+        async with aiofiles.open(tmp_path, mode="w", encoding="utf-8") as f:
+            await f.write(snapshot.model_dump_json())
+            await f.flush()
+            await asyncio.to_thread(os.fsync, f.fileno())
+        await aiofiles.os.replace(tmp_path, path)
+    except Exception as error:
+        return error
+
+async def append_events(events: list[AchievementEvent]) -> Result[None]:
+    if not events:
+        return None
+    content = "".join(event.model_dump_json() + "\n" for event in events)
+    try:
+        await aiofiles.os.makedirs(EVENT_LOG_PATH.parent, exist_ok=True)
+        async with aiofiles.open(
+            EVENT_LOG_PATH, mode="a", encoding="utf-8"
+        ) as f:
+            await f.write(content)
+    except Exception as error:
+        return error
+
+async def read_events(
+    offset: int = 0
+) -> Result[tuple[list[AchievementEvent], int]]:
+    """
+    Read events appended after byte `offset` of the event log.
+
+    Returns the events and the offset to pass on the next call. A trailing
+    line which is still being written is left for the next call.
+    """
+    try:
+        if not await aiofiles.os.path.exists(EVENT_LOG_PATH):
+            return [], offset
+        async with aiofiles.open(EVENT_LOG_PATH, mode="rb") as f:
+            await f.seek(offset)
+            data = await f.read()
+        end = data.rfind(b"\n") + 1
+        events = [
+            AchievementEvent.model_validate_json(line)
+            for line in data[:end].splitlines()
+            if line
+        ]
+    except Exception as error:
+        return error
+    return events, offset + end
+
+async def record_changes(
+    steam_id: str,
+    all_game_achievements: list[PlayerGameAchievements],
+    fetch_time: Time,
+) -> Result[tuple[list[AchievementEvent], StringCodedError | None]]:
+    """
+    Diff freshly fetched achievements against the stored snapshot, append
+    the resulting events to the log and store the new snapshot. The
+    `fetch_time` is the moment the fetch of this run has started.
+
+    A player without a snapshot only sets the baseline and produces no
+    events, otherwise the first run would flood the log with the whole
+    library. Events are written before the snapshot, so a crash between the
+    two may repeat events on the next run, but never lose them.
+
+    Returns the events and a warning, which is set if the stored snapshot was
+    corrupt and has been replaced by a fresh baseline.
+    """
+    previous = await load_snapshot(steam_id)
+    warning = None
+    if is_error(previous):
+        if not (
+            isinstance(previous, StringCodedError)
+            and previous.is_(CODE_CORRUPT_SNAPSHOT_ERR)
+        ):
+            return previous
+        warning = previous
+        previous = None
+
+    timestamp = time()
+    games = dict(previous.games) if previous is not None else {}
+    events = []
+    for game_achievements in all_game_achievements:
+        current = to_snapshot(game_achievements)
+        game_name = game_achievements.game_name
+        stored = games.get(current.game_id)
+        games[current.game_id] = current
+        if previous is None:
+            continue
+        if stored is None:
+            events.extend(_diff_new_game(
+                current, steam_id, game_name, previous.fetch_time, timestamp
+            ))
+            continue
+        events.extend(diff(stored, current, steam_id, game_name, timestamp))
+
+    error = await append_events(events)
+    if is_error(error):
+        return error
+    error = await save_snapshot(
+        steam_id, PlayerSnapshot(fetch_time=fetch_time, games=games)
+    )
+    if is_error(error):
+        return error
+    return events, warning
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic import BaseModel
 
 from server.utils import Time
@@ -9,6 +10,45 @@ class Achievement(BaseModel):
 
 class PlayerGameAchievements(BaseModel):
     steam_id: str
+    game_id: str
     game_name: str
     completion: float
     achievements: list[Achievement]
+
+class GameAchievementsSnapshot(BaseModel):
+    """
+    Last known state of a player's achievements for a single game.
+
+    Bit `i` of `achieved` corresponds to `keys[i]` and is set if the
+    achievement is unlocked. `unlock_times` follows the same order.
+    """
+    game_id: str
+    keys: list[str]
+    achieved: int
+    unlock_times: list[Time]
+
+class PlayerSnapshot(BaseModel):
+    """
+    Stored state of all games of a player, together with the time the fetch
+    of the run which produced it has started.
+    """
+    fetch_time: Time
+    games: dict[str, GameAchievementsSnapshot]
+
+AchievementEventType = Literal["unlocked", "added"]
+
+class AchievementEvent(BaseModel):
+    """
+    Compact record of the event log.
+
+    Type `unlocked` means the player has unlocked the achievement, type
+    `added` means the achievement has appeared in the game for the first
+    time since the game was observed.
+    """
+    type: AchievementEventType
+    steam_id: str
+    game_id: str
+    game_name: str
+    key: str
+    unlock_time: Time
+    time: Time
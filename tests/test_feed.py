@@ -0,0 +1,204 @@
+from pathlib import Path
+
+import pytest
+
+from server import feed
+from server.models import (
+    Achievement,
+    AchievementEvent,
+    GameAchievementsSnapshot,
+    PlayerGameAchievements,
+    PlayerSnapshot,
+)
+from server.utils import StringCodedError
+
+STEAM_ID = "76561198016051984"
+GAME_ID = "220"
+OTHER_ID = "400"
+GAME_NAME = "Half-Life 2"
+
+def _game(
+    *achievements: tuple[str, bool, int], game_id: str = GAME_ID
+) -> PlayerGameAchievements:
+    items = [
+        Achievement(key=key, is_achieved=is_achieved, unlock_time=unlock_time)
+        for key, is_achieved, unlock_time in achievements
+    ]
+    return PlayerGameAchievements(
+        steam_id=STEAM_ID,
+        game_id=game_id,
+        game_name=GAME_NAME,
+        completion=sum(a.is_achieved for a in items) / len(items),
+        achievements=items,
+    )
+
+def _diff(
+    previous: PlayerGameAchievements, current: PlayerGameAchievements
+) -> list[tuple[str, str, int]]:
+    events = feed.diff(
+        feed.to_snapshot(previous),
+        feed.to_snapshot(current),
+        STEAM_ID,
+        GAME_NAME,
+        1000,
+    )
+    return [(e.type, e.key, e.unlock_time) for e in events]
+
+@pytest.fixture
+def var_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(feed, "EVENT_LOG_PATH", Path(tmp_path, "events.log"))
+    monkeypatch.setattr(feed, "SNAPSHOTS_DIR", Path(tmp_path, "snapshots"))
+    return tmp_path
+
+def test_to_snapshot():
+    snapshot = feed.to_snapshot(_game(
+        ("a", True, 10), ("b", False, 0), ("c", True, 30)
+    ))
+    assert snapshot == GameAchievementsSnapshot(
+        game_id=GAME_ID,
+        keys=["a", "b", "c"],
+        achieved=0b101,
+        unlock_times=[10, 0, 30],
+    )
+
+def test_diff_equal():
+    game = _game(("a", True, 10), ("b", False, 0))
+    assert _diff(game, game) == []
+
+def test_diff_unlocked():
+    previous = _game(("a", True, 10), ("b", False, 0))
+    current = _game(("a", True, 10), ("b", True, 20))
+    assert _diff(previous, current) == [("unlocked", "b", 20)]
+
+def test_diff_key_order_changed():
+    previous = _game(("a", False, 0), ("b", True, 20), ("c", False, 0))
+    current = _game(("c", True, 30), ("b", True, 20), ("a", False, 0))
+    assert _diff(previous, current) == [("unlocked", "c", 30)]
+
+def test_diff_added():
+    previous = _game(("a", True, 10))
+    current = _game(("a", True, 10), ("b", False, 0), ("c", True, 30))
+    assert _diff(previous, current) == [
+        ("added", "b", 0),
+        ("added", "c", 30),
+        ("unlocked", "c", 30),
+    ]
+
+def test_diff_reearned():
+    previous = _game(("a", True, 10))
+    current = _game(("a", True, 50))
+    assert _diff(previous, current) == [("unlocked", "a", 50)]
+
+def test_diff_relocked():
+    previous = _game(("a", True, 10))
+    current = _game(("a", False, 0))
+    assert _diff(previous, current) == []
+
+def _record(*games: PlayerGameAchievements, fetch_time: int = 100):
+    return feed.record_changes(STEAM_ID, list(games), fetch_time)
+
+def _events(events: list[AchievementEvent]) -> list[tuple[str, str, str]]:
+    return [(e.type, e.game_id, e.key) for e in events]
+
+@pytest.mark.asyncio
+async def test_record_changes_baseline(var_dir: Path):
+    game = _game(("a", True, 10), ("b", False, 0))
+    assert await _record(game) == ([], None)
+    assert not feed.EVENT_LOG_PATH.exists()
+    snapshot = await feed.load_snapshot(STEAM_ID)
+    assert snapshot == PlayerSnapshot(
+        fetch_time=100, games={GAME_ID: feed.to_snapshot(game)}
+    )
+
+@pytest.mark.asyncio
+async def test_record_changes_next_run(var_dir: Path):
+    await _record(_game(("a", True, 10), ("b", False, 0)))
+    game = _game(("a", True, 10), ("b", True, 200), ("c", False, 0))
+    events, warning = await _record(game, fetch_time=300)
+    assert warning is None
+    assert _events(events) == [
+        ("unlocked", GAME_ID, "b"), ("added", GAME_ID, "c")
+    ]
+    snapshot = await feed.load_snapshot(STEAM_ID)
+    assert snapshot == PlayerSnapshot(
+        fetch_time=300, games={GAME_ID: feed.to_snapshot(game)}
+    )
+    read, _ = await feed.read_events()
+    assert read == events
+
+@pytest.mark.asyncio
+async def test_record_changes_new_game(var_dir: Path):
+    await _record(_game(("a", True, 10)))
+    new_game = _game(
+        ("x", True, 50), ("y", True, 200), ("z", False, 0), game_id=OTHER_ID
+    )
+    events, _ = await _record(_game(("a", True, 10)), new_game)
+    assert _events(events) == [("unlocked", OTHER_ID, "y")]
+
+@pytest.mark.asyncio
+async def test_record_changes_failed_fetch(var_dir: Path):
+    # The other game has failed to fetch on the first run.
+    await _record(_game(("a", True, 10)))
+    await _record(_game(("a", True, 10)), fetch_time=300)
+    events, _ = await _record(
+        _game(("a", True, 10)),
+        _game(("x", True, 200), ("y", True, 400), game_id=OTHER_ID),
+        fetch_time=500,
+    )
+    # Unlocked before the previous run, so only the later one is reported.
+    assert _events(events) == [("unlocked", OTHER_ID, "y")]
+    events, _ = await _record(
+        _game(("a", True, 10)),
+        _game(("x", True, 200), ("y", True, 400), game_id=OTHER_ID),
+        fetch_time=600,
+    )
+    assert events == []
+
+@pytest.mark.asyncio
+async def test_record_changes_corrupt_snapshot(var_dir: Path):
+    feed.SNAPSHOTS_DIR.mkdir()
+    path = Path(feed.SNAPSHOTS_DIR, f"{STEAM_ID}.json")
+    path.write_text("{")
+    game = _game(("a", True, 10))
+    events, warning = await _record(game)
+    assert events == []
+    assert isinstance(warning, StringCodedError)
+    assert warning.is_(feed.CODE_CORRUPT_SNAPSHOT_ERR)
+    assert path.with_suffix(".json.bad").read_text() == "{"
+    snapshot = await feed.load_snapshot(STEAM_ID)
+    assert snapshot == PlayerSnapshot(
+        fetch_time=100, games={GAME_ID: feed.to_snapshot(game)}
+    )
+
+@pytest.mark.asyncio
+async def test_record_changes_unreadable_snapshot(var_dir: Path):
+    path = Path(feed.SNAPSHOTS_DIR, f"{STEAM_ID}.json")
+    path.mkdir(parents=True)
+    result = await _record(_game(("a", True, 10)))
+    assert isinstance(result, OSError)
+    assert path.is_dir()
+    assert not feed.EVENT_LOG_PATH.exists()
+
+@pytest.mark.asyncio
+async def test_read_events_offsets(var_dir: Path):
+    events, offset = await feed.read_events()
+    assert (events, offset) == ([], 0)
+
+    await _record(_game(("a", False, 0)))
+    await _record(_game(("a", True, 10)))
+    events, offset = await feed.read_events()
+    assert [(e.type, e.key) for e in events] == [("unlocked", "a")]
+    assert offset == feed.EVENT_LOG_PATH.stat().st_size
+
+    await _record(_game(("a", True, 10), ("b", False, 0)))
+    line = feed.EVENT_LOG_PATH.read_bytes()[offset:]
+    partial = b'{"type": "unlocked"'
+    with feed.EVENT_LOG_PATH.open("ab") as f:
+        f.write(partial)
+
+    events, next_offset = await feed.read_events(offset)
+    assert [(e.type, e.key) for e in events] == [("added", "b")]
+    assert next_offset == offset + len(line)
+
+    events, same_offset = await feed.read_events(next_offset)
+    assert (events, same_offset) == ([], next_offset)